@@ -911,17 +911,17 @@ class Experiment:
             return
         if self.verbosity >= 1:
             print("Reloading data from cache {}".format(path))
-        cache = np.load(path, allow_pickle=True)
-        for field in cache.files:
-            if field in dynamic_properties:
-                continue
-            value = cache[field]
-            if np.array_equal(value, None):
-                value = None
-            elif value.ndim == 0:
-                # Handle loading scalars
-                value = value.item()
-            setattr(self, field, value)
+        with np.load(path, allow_pickle=True) as cache:
+            for field in cache.files:
+                if field in dynamic_properties:
+                    continue
+                value = cache[field]
+                if np.array_equal(value, None):
+                    value = None
+                elif value.ndim == 0:
+                    # Handle loading scalars
+                    value = value.item()
+                setattr(self, field, value)
 
     def separation_prep(self, redo=False):
         r"""
@@ -1083,7 +1083,7 @@ class Experiment:
         if self.folder is not None:
             self.save_prep()
 
-    def save_prep(self, destination=None):
+    def save_prep(self, destination=None, compress=True):
         r"""
         Save prepared raw signals, extracted from images, to an npz file.
 
@@ -1095,6 +1095,9 @@ class Experiment:
             Path to output file. The default destination is
             ``"prepared.npz"`` within the cache directory
             ``experiment.folder``.
+        compress : bool, default=True
+            Whether to compress the npz file. Compression makes the file
+            smaller, but saving and loading it is slower.
         """
         fields = ["expansion", "means", "nCell", "nRegions", "raw", "roi_polys"]
         if destination is None:
@@ -1110,7 +1113,8 @@ class Experiment:
         destdir = os.path.dirname(destination)
         if destdir and not os.path.isdir(destdir):
             os.makedirs(destdir)
-        np.savez_compressed(
+        savez = np.savez_compressed if compress else np.savez
+        savez(
             destination,
             **{
                 field: getattr(self, field)
@@ -1294,7 +1298,7 @@ class Experiment:
         if self.folder is not None:
             self.save_separated()
 
-    def save_separated(self, destination=None):
+    def save_separated(self, destination=None, compress=True):
         r"""
         Save separated signals to an npz file.
 
@@ -1305,6 +1309,9 @@ class Experiment:
         destination : str, optional
             Path to output file. The default destination is ``"separated.npz"``
             within the cache directory ``experiment.folder``.
+        compress : bool, default=True
+            Whether to compress the npz file. Compression makes the file
+            smaller, but saving and loading it is slower.
         """
         fields = [
             "alpha",
@@ -1332,7 +1339,8 @@ class Experiment:
         destdir = os.path.dirname(destination)
         if destdir and not os.path.isdir(destdir):
             os.makedirs(destdir)
-        np.savez_compressed(
+        savez = np.savez_compressed if compress else np.savez
+        savez(
             destination,
             **{
                 field: getattr(self, field)
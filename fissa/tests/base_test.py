@@ -4,23 +4,28 @@ Provides a base test class for other test classes to inherit from.
 Includes the numpy testing functions as methods.
 """
 
+import binascii
 import contextlib
-import datetime
-import os.path
-import random
+import hashlib
+import os
 import shutil
-import string
 import sys
 import tempfile
+import time
 import unittest
 import warnings
-from inspect import getsourcefile
+from collections import Counter, defaultdict
 
 try:
     from collections import abc
 except ImportError:
     import collections as abc
 
+try:
+    from StringIO import StringIO  # Python 2, which also accepts str
+except ImportError:
+    from io import StringIO
+
 import numpy as np
 import pytest
 from numpy.testing import (
@@ -32,7 +37,74 @@ from numpy.testing import (
 
 # Check where the test directory is located, to be used when fetching
 # test resource files
-TEST_DIRECTORY = os.path.dirname(os.path.abspath(getsourcefile(lambda: 0)))
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Arrays of at least this many bytes are keyed by a hash of their contents in
+# _array_key, instead of by a copy of their contents
+_ARRAY_KEY_HASH_NBYTES = 65536
+
+
+def _as_dense_float(x):
+    """
+    Convert a possibly nested sequence of arrays into a dense numeric array.
+
+    Returns ``None`` if this is not possible, e.g. because `x` is ragged or
+    contains leaves which are not real numbers.
+    """
+    if isinstance(x, np.ndarray) and x.dtype == object:
+        x = x.tolist()
+    try:
+        x = np.array(x)
+    except (TypeError, ValueError):
+        return None
+    if x.dtype.kind not in "biuf":
+        return None
+    return x
+
+
+def _numeric_leaves(x, structure, leaves):
+    """
+    Collect the numeric arrays nested within `x`, in order.
+
+    The shape of each container and leaf array is appended to `structure`,
+    and each leaf array to `leaves`. Returns ``False`` if any of the leaves
+    are not numeric.
+    """
+    if isinstance(x, np.ndarray) and x.dtype == object:
+        structure.append(("container", x.shape))
+        return all(_numeric_leaves(item, structure, leaves) for item in x.flat)
+    if isinstance(x, (list, tuple)):
+        structure.append(("container", (len(x),)))
+        return all(_numeric_leaves(item, structure, leaves) for item in x)
+    x = np.asarray(x)
+    if x.dtype.kind not in "biuf":
+        return False
+    structure.append(("leaf", x.shape))
+    leaves.append(x)
+    return True
+
+
+def _assert_allclose_flattened(actual, desired):
+    """
+    Compare two ragged structures by concatenating their numeric leaves.
+
+    Returns ``False``, without checking the values, if the structures differ
+    or contain non-numeric leaves.
+    """
+    actual_structure, actual_leaves = [], []
+    desired_structure, desired_leaves = [], []
+    if not _numeric_leaves(actual, actual_structure, actual_leaves):
+        return False
+    if not _numeric_leaves(desired, desired_structure, desired_leaves):
+        return False
+    if actual_structure != desired_structure:
+        return False
+    if actual_leaves:
+        assert_allclose(
+            np.concatenate([x.ravel() for x in actual_leaves]),
+            np.concatenate([x.ravel() for x in desired_leaves]),
+        )
+    return True
 
 
 def assert_allclose_ragged(actual, desired):
@@ -41,6 +113,18 @@ def assert_allclose_ragged(actual, desired):
             "ignore",
             message="Creating an ndarray from ragged nested sequences",
         )
+        # Fast path: if both inputs can be stacked into dense arrays of the
+        # same shape, compare them all at once.
+        actual_dense = _as_dense_float(actual)
+        if actual_dense is not None:
+            desired_dense = _as_dense_float(desired)
+            if desired_dense is not None and actual_dense.shape == desired_dense.shape:
+                assert_allclose(actual_dense, desired_dense)
+                return
+        # If the inputs are ragged, but have the same structure, compare all
+        # their values at once.
+        if _assert_allclose_flattened(actual, desired):
+            return
         assert_equal(
             np.array(actual, dtype=object).shape,
             np.array(desired, dtype=object).shape,
@@ -55,20 +139,142 @@ def assert_allclose_ragged(actual, desired):
                 assert_allclose(actual_i, desired_i)
 
 
+def _is_same_array(actual, desired):
+    """
+    Check whether two objects are the same array, or views of the same data.
+
+    This is a cheap check which never inspects array contents. A return value
+    of ``False`` does not mean the arrays are unequal.
+    """
+    if actual is desired:
+        return True
+    if not isinstance(actual, np.ndarray) or not isinstance(desired, np.ndarray):
+        return False
+    return (
+        actual.shape == desired.shape
+        and actual.dtype == desired.dtype
+        and actual.strides == desired.strides
+        and actual.ctypes.data == desired.ctypes.data
+    )
+
+
+def _array_key(arr):
+    """
+    Build a hashable key which uniquely identifies the contents of an array.
+
+    Small arrays are keyed by their raw bytes. Large arrays are keyed by a
+    digest of their buffer instead, which avoids copying their contents.
+    """
+    arr = np.ascontiguousarray(arr)
+    if arr.nbytes < _ARRAY_KEY_HASH_NBYTES or arr.dtype.hasobject:
+        return (arr.shape, arr.dtype.str, arr.tobytes())
+    blake2b = getattr(hashlib, "blake2b", None)  # Python 3.6+
+    h = hashlib.sha256() if blake2b is None else blake2b(digest_size=16)
+    h.update(arr.data)
+    return (arr.shape, arr.dtype.str, h.digest())
+
+
+def _array_equal_nan(actual, desired):
+    """
+    Check whether two arrays are equal, treating NaNs in the same place as equal.
+
+    This matches the semantics of the bitwise comparison in
+    :func:`_array_key`, irrespective of whether the dtypes of the arrays
+    differ.
+    """
+    actual = np.asarray(actual)
+    desired = np.asarray(desired)
+    if actual.shape != desired.shape:
+        return False
+    if actual.dtype.kind not in "fc" or desired.dtype.kind not in "fc":
+        return np.array_equal(actual, desired)
+    actual_nan = np.isnan(actual)
+    desired_nan = np.isnan(desired)
+    return np.array_equal(actual_nan, desired_nan) and np.array_equal(
+        actual[~actual_nan], desired[~desired_nan]
+    )
+
+
 def assert_equal_list_of_array_perm_inv(actual, desired):
+    """
+    Check two lists contain the same arrays, irrespective of their order.
+
+    NaN values are considered equal to each other, whatever the dtype of the
+    arrays containing them.
+
+    Parameters
+    ----------
+    actual : list of array_like
+        Actual arrays.
+    desired : list of array_like
+        Desired arrays.
+    """
+    if actual is desired:
+        return
     assert_equal(len(actual), len(desired))
-    for desired_i in desired:
-        n_matches = 0
-        for actual_j in actual:
-            if np.equal(actual_j, desired_i).all():
-                n_matches += 1
-        assert n_matches >= 0
+    # Fast path: if the lists contain bitwise identical arrays, their keys
+    # will match without needing to compare every pair of arrays.
+    if Counter(_array_key(x) for x in actual) == Counter(
+        _array_key(x) for x in desired
+    ):
+        return
+    # Arrays can have equal values without being bitwise identical (e.g. if
+    # their dtypes differ), so try to match each desired array to a distinct
+    # actual array. Equal arrays must have the same shape, so we only need to
+    # search among the actual arrays with the same shape as each desired array.
+    actual_by_shape = defaultdict(list)
+    for actual_j in actual:
+        actual_by_shape[np.shape(actual_j)].append(actual_j)
+    desired_shapes = Counter(np.shape(x) for x in desired)
+    for shape, count in desired_shapes.items():
+        if len(actual_by_shape[shape]) != count:
+            raise AssertionError(
+                "Expected {} arrays with shape {}, but found {}".format(
+                    count, shape, len(actual_by_shape[shape])
+                )
+            )
+    # Each actual array can only be matched once.
+    for i, desired_i in enumerate(desired):
+        candidates = actual_by_shape[np.shape(desired_i)]
+        for j, actual_j in enumerate(candidates):
+            if _is_same_array(actual_j, desired_i) or _array_equal_nan(
+                actual_j, desired_i
+            ):
+                del candidates[j]
+                break
+        else:
+            raise AssertionError(
+                "No match in actual for desired[{}]:\n{}".format(i, desired_i)
+            )
 
 
 def assert_equal_dict_of_array(actual, desired):
-    assert_equal(actual.keys(), desired.keys())
-    for k in desired.keys():
-        assert_equal(actual[k], desired[k])
+    """
+    Check two dictionaries have the same keys and equal array values.
+
+    Parameters
+    ----------
+    actual : dict
+        Actual dictionary.
+    desired : dict
+        Desired dictionary.
+    """
+    if actual is desired:
+        return
+    desired_keys = set(desired)
+    actual_keys = set(actual)
+    if desired_keys != actual_keys:
+        raise AssertionError(
+            "key mismatch: missing={}, extra={}".format(
+                desired_keys - actual_keys, actual_keys - desired_keys
+            )
+        )
+    for k in desired:
+        if _is_same_array(actual[k], desired[k]):
+            continue
+        if not np.array_equal(actual[k], desired[k]):
+            # Use assert_equal to raise an error with a full description
+            assert_equal(actual[k], desired[k])
 
 
 def assert_starts_with(actual, desired):
@@ -80,32 +286,15 @@ def assert_starts_with(actual, desired):
     desired : str
         Desired initial string.
     actual : str-like
-        Actual string or string-like object.
+        Actual string or string-like object, which is compared using
+        ``str(actual)``.
     """
-    try:
-        assert len(actual) >= len(desired)
-    except BaseException:
-        print(
-            "Actual string too short ({} < {} characters)".format(
-                len(actual), len(desired)
-            )
+    actual_str = actual if isinstance(actual, str) else str(actual)
+    if not actual_str.startswith(desired):
+        raise AssertionError(
+            "String does not start with the desired prefix\n"
+            "ACTUAL: {}\nDESIRED prefix: {}".format(actual_str, desired)
         )
-        print("ACTUAL: {}".format(actual))
-        raise
-    try:
-        return assert_equal(str(actual)[: len(desired)], desired)
-    except BaseException as err:
-        msg = "ACTUAL: {}".format(actual)
-        if isinstance(getattr(err, "args", None), str):
-            err.args += "\n" + msg
-        elif isinstance(getattr(err, "args", None), tuple):
-            if len(err.args) == 1:
-                err.args = (err.args[0] + "\n" + msg,)
-            else:
-                err.args += (msg,)
-        else:
-            print(msg)
-        raise
 
 
 class BaseTestCase(unittest.TestCase):
@@ -117,43 +306,56 @@ class BaseTestCase(unittest.TestCase):
     # a top-level variable
     test_directory = TEST_DIRECTORY
 
+    # Bind the numpy.testing functions directly to the class, so the wrapper
+    # methods below call them without a module-level global lookup
+    _assert_allclose_impl = staticmethod(assert_allclose)
+    _assert_array_equal_impl = staticmethod(assert_array_equal)
+    _assert_equal_impl = staticmethod(assert_equal)
+
     def __init__(self, *args, **kwargs):
         """Instance initialisation."""
-        # First do the __init__ associated with parent class
-        # super(self).__init__(*args, **kw)  # Only works on Python3
-        super(BaseTestCase, self).__init__(*args, **kwargs)  # Works on Python2
+        # First do the __init__ associated with parent class. The explicit
+        # form of super is needed while Python 2.7 remains supported.
+        super(BaseTestCase, self).__init__(*args, **kwargs)
         # Add a test to automatically use when comparing objects of
         # type numpy ndarray. This will be used for self.assertEqual().
-        self.addTypeEqualityFunc(np.ndarray, self.assert_allclose)
-        self.tempdir = os.path.join(
-            tempfile.gettempdir(),
-            "out-" + self.generate_temp_name(),
-        )
+        self.addTypeEqualityFunc(np.ndarray, self._assert_ndarray_equal)
+
+    @property
+    def tempdir(self):
+        """
+        Randomly named temporary output path, generated on first access.
+        """
+        if getattr(self, "_tempdir", None) is None:
+            self._tempdir = os.path.join(
+                tempfile.gettempdir(),
+                "out-" + self.generate_temp_name(),
+            )
+        return self._tempdir
 
     def generate_temp_name(self, n_character=12):
         """
         Generate a random string to use as a temporary output path.
         """
-        population = string.ascii_uppercase + string.digits
-        if hasattr(random, "choices"):
-            # Python 3.6+
-            rstr = "".join(random.choices(population, k=n_character))
-        else:
-            # Python 2.7/3.5
-            rstr = "".join(random.choice(population) for _ in range(n_character))
-        return "{}-{}".format(datetime.datetime.now().strftime("%M%S%f"), rstr)
+        # A single os.urandom call for the random component, with a short
+        # time-based prefix. Both work on Python 2.7 as well as Python 3.
+        rstr = binascii.hexlify(os.urandom((n_character + 1) // 2))
+        rstr = rstr.decode("ascii").upper()[:n_character]
+        return "{:x}-{}".format(int(time.time() * 1e6) & 0xFFFFFFFF, rstr)
 
     def tearDown(self):
-        # If it was created, delete the randomly generated temporary directory
-        if os.path.isdir(self.tempdir):
-            shutil.rmtree(self.tempdir)
-
-    @contextlib.contextmanager
-    def subTest(self, *args, **kwargs):
-        # For backwards compatability with Python < 3.4
-        if hasattr(super(BaseTestCase, self), "subTest"):
-            yield super(BaseTestCase, self).subTest(*args, **kwargs)
-        else:
+        # Delete the randomly generated temporary directory. Its path is only
+        # generated when a test uses it, so tests which never requested a
+        # tempdir have nothing to clean up and don't need to check the disk.
+        tempdir = getattr(self, "_tempdir", None)
+        if tempdir is not None:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    if not hasattr(unittest.TestCase, "subTest"):
+        # For backwards compatability with Python < 3.4. On newer versions,
+        # calls resolve directly to unittest.TestCase.subTest.
+        @contextlib.contextmanager
+        def subTest(self, *args, **kwargs):
             yield None
 
     @pytest.fixture(autouse=True)
@@ -180,27 +382,73 @@ class BaseTestCase(unittest.TestCase):
             and stderr since the previous capture with `~pytest.capsys`.
         """
         capture_now = self.capsys.readouterr()
-        for capture in captures:
-            sys.stdout.write(capture.out)
-            sys.stderr.write(capture.err)
-        sys.stdout.write(capture_now.out)
-        sys.stderr.write(capture_now.err)
+        captures = captures + (capture_now,)
+        out = "".join(capture.out for capture in captures)
+        err = "".join(capture.err for capture in captures)
+        if out:
+            sys.stdout.write(out)
+        if err:
+            sys.stderr.write(err)
         return capture_now
 
+    def _assert_ndarray_equal(self, actual, desired, msg=None):
+        """
+        Equality function used by assertEqual for numpy arrays.
+
+        Integer and boolean arrays are compared exactly; all other arrays
+        are compared with :func:`numpy.testing.assert_allclose`.
+        """
+        if actual.dtype.kind in "biu" and desired.dtype.kind in "biu":
+            if not np.array_equal(actual, desired):
+                # Use assert_array_equal to raise an error with a full description
+                self._assert_array_equal_impl(actual, desired, err_msg=msg or "")
+            return
+        return self._assert_allclose_impl(actual, desired)
+
+    @contextlib.contextmanager
+    def capture_stdout(self):
+        """
+        Capture stdout directly into a buffer, bypassing pytest's capture.
+
+        Yields
+        ------
+        buffer : StringIO
+            Buffer which receives everything written to stdout within the
+            context. Use ``buffer.getvalue()`` to get the output.
+        """
+        buffer = StringIO()
+        original_stdout = sys.stdout
+        sys.stdout = buffer
+        try:
+            yield buffer
+        finally:
+            sys.stdout = original_stdout
+
     def assert_almost_equal(self, actual, desired, *args, **kwargs):
         return assert_almost_equal(actual, desired, *args, **kwargs)
 
     def assert_array_equal(self, actual, desired, *args, **kwargs):
-        return assert_array_equal(actual, desired, *args, **kwargs)
+        if args or kwargs:
+            return self._assert_array_equal_impl(actual, desired, *args, **kwargs)
+        kinds = np.asarray(actual).dtype.kind + np.asarray(desired).dtype.kind
+        if all(kind in "biu" for kind in kinds):
+            if np.array_equal(actual, desired):
+                return
+        elif all(kind in "biuf" for kind in kinds):
+            return self._assert_allclose_impl(
+                actual, desired, rtol=0, atol=0, equal_nan=True
+            )
+        # Use assert_array_equal to raise an error with a full description
+        return self._assert_array_equal_impl(actual, desired)
 
     def assert_allclose(self, actual, desired, *args, **kwargs):
         # Handle msg argument, which is passed from assertEqual, established
         # with addTypeEqualityFunc in __init__
         kwargs.pop("msg", None)
-        return assert_allclose(actual, desired, *args, **kwargs)
+        return self._assert_allclose_impl(actual, desired, *args, **kwargs)
 
     def assert_equal(self, actual, desired, *args, **kwargs):
-        return assert_equal(actual, desired, *args, **kwargs)
+        return self._assert_equal_impl(actual, desired, *args, **kwargs)
 
     def assert_allclose_ragged(self, actual, desired):
         if desired is None:
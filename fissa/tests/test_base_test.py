@@ -0,0 +1,30 @@
+"""Unit tests for the helpers in base_test.py."""
+
+from __future__ import division
+
+import numpy as np
+
+from .base_test import BaseTestCase
+
+
+class TestAssertEqualListOfArrayPermInv(BaseTestCase):
+    """Test assert_equal_list_of_array_perm_inv."""
+
+    def test_nan_same_dtype(self):
+        """NaNs match when the arrays are bitwise identical."""
+        actual = [np.array([np.nan, 1.0]), np.array([2.0, 3.0])]
+        desired = [np.array([2.0, 3.0]), np.array([np.nan, 1.0])]
+        self.assert_equal_list_of_array_perm_inv(actual, desired)
+
+    def test_nan_mixed_dtype(self):
+        """NaNs match when the arrays have different dtypes."""
+        actual = [np.array([np.nan, 1.0], dtype=np.float32), np.array([2.0, 3.0])]
+        desired = [np.array([2.0, 3.0]), np.array([np.nan, 1.0], dtype=np.float64)]
+        self.assert_equal_list_of_array_perm_inv(actual, desired)
+
+    def test_nan_mismatch(self):
+        """NaNs in different places do not match."""
+        actual = [np.array([np.nan, 1.0], dtype=np.float32)]
+        desired = [np.array([1.0, np.nan], dtype=np.float64)]
+        with self.assertRaises(AssertionError):
+            self.assert_equal_list_of_array_perm_inv(actual, desired)
@@ -2,33 +2,263 @@
 
 from __future__ import division
 
+import contextlib
+import copy
 import datetime
 import os
+import re
 import shutil
 import sys
 import types
 import unittest
 import warnings
+import zipfile
 
 import numpy as np
+import pytest
 from scipy.io import loadmat
 
 from .. import core, extraction
-from .base_test import BaseTestCase
+from . import base_test
+from .base_test import TEST_DIRECTORY, BaseTestCase
+
+RESOURCES_DIR = os.path.join(TEST_DIRECTORY, "resources", "b")
+
+# Contents of an npz file which contains no arrays, as saved by np.savez with no
+# arguments. This is an empty zip file, consisting only of the "end of central
+# directory" record.
+EMPTY_NPZ_BYTES = b"PK\x05\x06" + b"\x00" * 18
+
+# Separated experiments without a cache folder, shared between tests so the
+# separation only needs to be run once per set of inputs
+_SEPARATED_EXPERIMENTS = {}
+
+# Matches keyword arguments within the str/repr of an Experiment, where the
+# argument is followed by a comma
+_REPR_KWARG_PATTERN = re.compile(r"(\w+)=([^,)]+),")
+
+# Folders containing the cache files of separated experiments, used to seed
+# the cache folder of tests which load from the cache
+_SEEDED_CACHES = {}
+
+# Test images loaded as arrays, shared between tests which use pre-loaded images
+_PRELOADED_IMAGES = {}
+
+# Expected outputs of the test experiments, keyed by resources directory
+_EXPECTED = {}
+
+# Messages of the warnings raised when dividing by zero, as may happen when
+# computing f/f0 with a baseline from the separated signals
+_DIVZERO_MESSAGES = ("divide by zero", "invalid value encountered in true_divide")
+
+
+@contextlib.contextmanager
+def ignore_divzero():
+    """
+    Context manager which ignores warnings about division by zero.
+
+    The warnings state is restored on exit.
+    """
+    with warnings.catch_warnings():
+        for message in _DIVZERO_MESSAGES:
+            warnings.filterwarnings("ignore", message=message)
+        yield
+
+
+class _LazyNpz(object):
+    """
+    Read-only mapping to the arrays in an npz file, loaded on first access.
+
+    Each array is only read from the file the first time it is accessed, and
+    is then reused for later accesses. Only the requested member is read from
+    the file, which is not held open between accesses.
+
+    Parameters
+    ----------
+    fname : str
+        Path to the npz file.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            with np.load(self.fname, allow_pickle=True) as npz:
+                self._cache[key] = npz[key]
+        return self._cache[key]
+
+
+def load_expected(resources_dir):
+    """
+    Get the expected outputs for the test experiment in a resources directory.
+
+    Each output is only loaded the first time it is used, and the outputs are
+    shared between all the tests in the session, so must not be modified.
+
+    Parameters
+    ----------
+    resources_dir : str
+        Directory containing the ``"expected_py{2,3}.npz"`` files.
+
+    Returns
+    -------
+    expected : _LazyNpz
+        Mapping from output names to their expected values, for the running
+        version of Python.
+    """
+    if resources_dir not in _EXPECTED:
+        fname = os.path.join(
+            resources_dir, "expected_py{}.npz".format(sys.version_info.major)
+        )
+        _EXPECTED[resources_dir] = _LazyNpz(fname)
+    return _EXPECTED[resources_dir]
 
 
 class ExperimentTestMixin:
     """Base tests for Experiment class."""
 
-    def __init__(self, *args, **kwargs):
-        self.output_dir = self.tempdir
+    @pytest.fixture(autouse=True)
+    def fixture_request(self, request):
+        # Keep the fixture request, so fixtures can be requested on demand
+        self._request = request
+
+    @property
+    def output_dir(self):
+        """
+        Path to use as the output folder, which does not exist yet.
+
+        This is inside pytest's per-test temporary directory, which pytest
+        cleans up for us. The temporary directory is only created for tests
+        which use this property.
+        """
+        if getattr(self, "_output_dir", None) is None:
+            tmpdir = self._request.getfixturevalue("tmpdir")
+            self._output_dir = os.path.join(str(tmpdir), "output")
+        return self._output_dir
+
+    def get_separated_experiment(self, **kwargs):
+        """
+        Get a copy of a separated experiment, which does not have a cache folder.
+
+        The separation is only run the first time this is called for the test
+        data, and each call returns an independent deep copy of the result.
+        Use this when separation is setup for a test, not what is under test.
+
+        Parameters
+        ----------
+        **kwargs
+            Attributes to set on the copied experiment (e.g. ``verbosity``).
+
+        Returns
+        -------
+        exp : fissa.Experiment
+            Separated experiment.
+        """
+        key = (self.images_dir, self.roi_zip_path)
+        if key not in _SEPARATED_EXPERIMENTS:
+            exp = core.Experiment(self.images_dir, self.roi_zip_path)
+            exp.separate()
+            _SEPARATED_EXPERIMENTS[key] = exp
+        exp = copy.deepcopy(_SEPARATED_EXPERIMENTS[key])
+        for k, v in kwargs.items():
+            setattr(exp, k, v)
+        return exp
+
+    def seed_cache(self, folder, separated=True):
+        """
+        Populate a folder with the cache files of a separated experiment.
+
+        The cache files are only generated the first time this is called for
+        the test data, and are then copied into `folder` on each call.
+
+        Parameters
+        ----------
+        folder : str
+            Cache folder to populate. Created if it does not exist.
+        separated : bool
+            Whether to include ``"separated.npz"``, as well as
+            ``"prepared.npz"``. Default is ``True``.
+        """
+        key = (self.images_dir, self.roi_zip_path)
+        if key not in _SEEDED_CACHES:
+            tmpdir = self._request.getfixturevalue("tmpdir_factory").mktemp("cache")
+            exp = self.get_separated_experiment(verbosity=0)
+            exp.save_prep(os.path.join(str(tmpdir), "prepared.npz"))
+            exp.save_separated(os.path.join(str(tmpdir), "separated.npz"))
+            _SEEDED_CACHES[key] = str(tmpdir)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        fnames = ["prepared.npz", "separated.npz"] if separated else ["prepared.npz"]
+        for fname in fnames:
+            shutil.copyfile(
+                os.path.join(_SEEDED_CACHES[key], fname), os.path.join(folder, fname)
+            )
+
+    def write_cache_file(self, fname, contents):
+        """
+        Write raw bytes to a cache file in the output folder.
+
+        Parameters
+        ----------
+        fname : str
+            Name of the cache file within ``output_dir``.
+        contents : bytes
+            Contents of the file.
+        """
+        with open(os.path.join(self.output_dir, fname), "wb") as f:
+            f.write(contents)
+
+    def write_bad_cache(self, fname):
+        """
+        Write a corrupted cache file to the output folder.
+
+        Parameters
+        ----------
+        fname : str
+            Name of the cache file within ``output_dir``.
+        """
+        self.write_cache_file(fname, b"badfilecontents")
 
-    def setUp(self):
-        self.tearDown()
+    def write_empty_cache(self, fname):
+        """
+        Write a cache file containing no arrays to the output folder.
 
-    def tearDown(self):
-        if os.path.isdir(self.output_dir):
-            shutil.rmtree(self.output_dir)
+        Parameters
+        ----------
+        fname : str
+            Name of the cache file within ``output_dir``.
+        """
+        self.write_cache_file(fname, EMPTY_NPZ_BYTES)
+
+    @property
+    def image_paths(self):
+        """Paths to each of the test images."""
+        return [os.path.join(self.images_dir, img) for img in self.image_names]
+
+    def get_preloaded_images(self):
+        """
+        Get the test images, loaded as arrays.
+
+        The images are only loaded from disk the first time this is called.
+        The arrays are shared between tests, so they are made read-only.
+
+        Returns
+        -------
+        images : list of numpy.ndarray
+            Loaded images, in the order given by ``image_names``.
+        """
+        key = (self.images_dir,) + tuple(self.image_names)
+        if key not in _PRELOADED_IMAGES:
+            datahandler = extraction.DataHandlerTifffile()
+            images = []
+            for pth in self.image_paths:
+                image = datahandler.image2array(pth)
+                image.setflags(write=False)
+                images.append(image)
+            _PRELOADED_IMAGES[key] = images
+        return list(_PRELOADED_IMAGES[key])
 
     def compare_result(self, actual):
         """
@@ -83,8 +313,13 @@ class ExperimentTestMixin:
         self.assert_equal(actual.means, self.expected["means"])
         self.assert_allclose_ragged(actual.roi_polys, self.expected["roi_polys"])
         # Check parameters match
-        self.assert_equal(actual.expansion, self.expected["expansion"])
-        self.assert_equal(actual.nRegions, self.expected["nRegions"])
+        params = ["expansion", "nRegions"]
+        if separated:
+            params += ["alpha", "max_iter", "max_tries", "method", "tol"]
+        self.assertEqual(
+            {k: getattr(actual, k) for k in params},
+            {k: self.expected[k].item() for k in params},
+        )
         if separated:
             # Check sizes are correct
             self.assert_equal(np.shape(actual.sep), expected_shape)
@@ -93,12 +328,6 @@ class ExperimentTestMixin:
             # Check contents are correct
             self.assert_allclose_ragged(actual.sep, self.expected["sep"])
             self.assert_allclose_ragged(actual.mixmat, self.expected["mixmat"])
-            # Check parameters match
-            self.assert_equal(actual.alpha, self.expected["alpha"])
-            self.assert_equal(actual.max_iter, self.expected["max_iter"])
-            self.assert_equal(actual.max_tries, self.expected["max_tries"])
-            self.assert_equal(actual.method, self.expected["method"])
-            self.assert_equal(actual.tol, self.expected["tol"])
         if compare_deltaf:
             self.assert_allclose_ragged(actual.deltaf_raw, self.expected["deltaf_raw"])
         if compare_deltaf and separated:
@@ -130,20 +359,25 @@ class ExperimentTestMixin:
             Whether to compare results of :meth:`fissa.Experiment.separate`.
             Default is ``True``.
         """
-        # We do all these comparisons explicitly one-by-one instead of in a
-        # for loop so you can see which one is failing.
-
         # Check the parameters are the same
         self.assert_equal(actual.images, expected.images)
         self.assert_equal(actual.rois, expected.rois)
+        # Scalar parameters are compared together as a dictionary, so the
+        # failure message shows which of them differ.
+        params = [
+            "nRegions",
+            "expansion",
+            "alpha",
+            "ncores_preparation",
+            "ncores_separation",
+            "method",
+        ]
         if folder:
-            self.assert_equal(actual.folder, expected.folder)
-        self.assert_equal(actual.nRegions, expected.nRegions)
-        self.assert_equal(actual.expansion, expected.expansion)
-        self.assert_equal(actual.alpha, expected.alpha)
-        self.assert_equal(actual.ncores_preparation, expected.ncores_preparation)
-        self.assert_equal(actual.ncores_separation, expected.ncores_separation)
-        self.assert_equal(actual.method, expected.method)
+            params.append("folder")
+        self.assertEqual(
+            {k: getattr(actual, k) for k in params},
+            {k: getattr(expected, k) for k in params},
+        )
         # self.assert_equal(actual.datahandler, expected.datahandler)
 
         if prepared:
@@ -195,8 +429,14 @@ class ExperimentTestMixin:
         if compare_deltaf is None:
             compare_deltaf = expected.deltaf_result is not None
         self.assertTrue(os.path.isfile(fname))
-        # Check contents of the .mat file
-        M = loadmat(fname)
+        # Check contents of the .mat file, only decoding the fields we check
+        keys = ["raw", "nRegions", "expansion", "alpha", "max_iter", "max_tries"]
+        keys += ["tol", "method"]
+        if prepared:
+            keys.append("means")
+        if separated:
+            keys += ["result", "sep", "mixmat"]
+        M = loadmat(fname, variable_names=keys)
         self.assert_allclose_ragged(M["raw"], expected.raw)
 
         # Check the parameters are the same
@@ -241,8 +481,16 @@ class ExperimentTestMixin:
         compare_matlab_legacy_expected, compare_output
         """
         self.assertTrue(os.path.isfile(fname))
-        # Check contents of the .mat file
-        M = loadmat(fname)
+        # Check contents of the .mat file, only decoding the fields we check
+        keys = ["raw", "means", "nCell", "expansion", "nRegions"]
+        if separated:
+            keys += ["sep", "result", "mixmat", "alpha", "max_iter", "max_tries"]
+            keys += ["method", "tol"]
+        if compare_deltaf:
+            keys.append("deltaf_raw")
+        if compare_deltaf and separated:
+            keys.append("deltaf_result")
+        M = loadmat(fname, variable_names=keys)
         # Check sizes are correct
         expected_shape = len(self.roi_paths), len(self.image_names)
         self.assert_equal(np.shape(M["raw"]), expected_shape)
@@ -295,8 +543,11 @@ class ExperimentTestMixin:
         if compare_deltaf is None:
             compare_deltaf = experiment.deltaf_result is not None
         self.assertTrue(os.path.isfile(fname))
-        # Check contents of the .mat file
-        M = loadmat(fname)
+        # Check contents of the .mat file, only decoding the fields we check
+        keys = ["raw", "result", "ROIs"]
+        if compare_deltaf:
+            keys += ["df_result", "df_raw"]
+        M = loadmat(fname, variable_names=keys)
         self.assert_allclose(M["raw"][0, 0][0][0, 0][0], experiment.raw[0, 0])
         self.assert_allclose(M["result"][0, 0][0][0, 0][0], experiment.result[0, 0])
         self.assert_allclose(
@@ -326,8 +577,11 @@ class ExperimentTestMixin:
             Default is ``True``.
         """
         self.assertTrue(os.path.isfile(fname))
-        # Check contents of the .mat file
-        M = loadmat(fname)
+        # Check contents of the .mat file, only decoding the fields we check
+        keys = ["raw", "result", "ROIs"]
+        if compare_deltaf:
+            keys += ["df_result", "df_raw"]
+        M = loadmat(fname, variable_names=keys)
         self.assert_allclose(M["raw"][0, 0][0][0, 0][0], self.expected["raw"][0, 0])
         self.assert_allclose(
             M["result"][0, 0][0][0, 0][0],
@@ -359,10 +613,12 @@ class ExperimentTestMixin:
         self.assertTrue("rois=" in actual)
         if not params:
             return
-        for param, value in params.items():
-            expected = "{}={},".format(param, repr(value))
-            print("Testing presence of ~ {} ~".format(expected))
-            self.assertTrue(expected in actual)
+        # Find all the keyword arguments in a single pass
+        found = dict(_REPR_KWARG_PATTERN.findall(actual))
+        self.assertEqual(
+            {param: found.get(param) for param in params},
+            {param: repr(value) for param, value in params.items()},
+        )
 
     def test_repr_class(self):
         exp = core.Experiment(self.images_dir, self.roi_zip_path)
@@ -425,7 +681,9 @@ class ExperimentTestMixin:
         fissa.extraction = extraction
         print("Evaluating: {}".format(actual))
         exp2 = eval(actual)
-        self.compare_experiments(exp, exp2)
+        # Neither experiment has been run, so only their parameters need
+        # to be compared.
+        self.compare_experiments(exp, exp2, prepared=False, separated=False)
 
     def test_initial_shapes(self):
         """Check nCell and nTrials are correct after init, before extracting data."""
@@ -441,17 +699,14 @@ class ExperimentTestMixin:
         self.compare_str_repr_contents(repr(exp))
 
     def test_imagelist_roizip(self):
-        image_paths = [os.path.join(self.images_dir, img) for img in self.image_names]
-        exp = core.Experiment(image_paths, self.roi_zip_path)
+        exp = core.Experiment(self.image_paths, self.roi_zip_path)
         exp.separate()
         self.compare_output(exp)
         self.compare_str_repr_contents(str(exp))
         self.compare_str_repr_contents(repr(exp))
 
     def test_imagelistloaded_roizip(self):
-        image_paths = [os.path.join(self.images_dir, img) for img in self.image_names]
-        datahandler = extraction.DataHandlerTifffile()
-        images = [datahandler.image2array(pth) for pth in image_paths]
+        images = self.get_preloaded_images()
         exp = core.Experiment(images, self.roi_zip_path)
         exp.separate()
         self.compare_output(exp)
@@ -487,101 +742,87 @@ class ExperimentTestMixin:
         self.assert_equal(capture_post.out, "")
         self.compare_output(exp)
 
-    def test_verbosity_1(self):
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=1)
-        exp.separate()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue("Finished separating" in capture_post.out)
-        self.assertTrue("Extracting traces: 100%" in capture_post.err)
-        self.assertTrue("Separating data: 100%" in capture_post.err)
-        self.assertTrue("{0}/{0}".format(len(self.image_names)) in capture_post.err)
-        self.assertTrue("{0}/{0}".format(len(self.roi_paths)) in capture_post.err)
-        self.assertFalse("Doing region growing and data extraction" in capture_post.out)
-        self.assertFalse("nRegions: " in capture_post.out)
-        self.assertFalse("method: " in capture_post.out)
-        self.compare_output(exp)
-
-    def test_verbosity_2(self):
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=2)
-        exp.separate()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue("Finished separating" in capture_post.out)
-        self.assertTrue("Extracting traces: 100%" in capture_post.err)
-        self.assertTrue("Separating data: 100%" in capture_post.err)
-        self.assertTrue("{0}/{0}".format(len(self.image_names)) in capture_post.err)
-        self.assertTrue("{0}/{0}".format(len(self.roi_paths)) in capture_post.err)
-        self.assertTrue("Doing region growing and data extraction" in capture_post.out)
-        self.assertTrue("nRegions: " in capture_post.out)
-        self.assertTrue("method: " in capture_post.out)
-        self.assertFalse(
-            "[Extraction 1/{}]".format(len(self.image_names)) in capture_post.out
-        )
-        self.assertFalse(
-            "[Separation 1/{}]".format(len(self.roi_paths)) in capture_post.out
-        )
-        self.compare_output(exp)
-
-    def test_verbosity_3(self):
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=1,
-            ncores_separation=1,
-            verbosity=3,
-        )
-        exp.separate()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue("Doing region growing and data extraction" in capture_post.out)
-        self.assertTrue(
-            "[Extraction 1/{}]".format(len(self.image_names)) in capture_post.out
-        )
-        self.assertTrue(
-            "[Separation 1/{}]".format(len(self.roi_paths)) in capture_post.out
-        )
-        self.assertFalse("] Extraction finished" in capture_post.out)
-        self.assertFalse("] Signal separation finished" in capture_post.out)
-        self.compare_output(exp)
-
-    def test_verbosity_4(self):
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=1,
-            ncores_separation=1,
-            verbosity=4,
-        )
-        exp.separate()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-outputs
-        self.assertTrue("] Extraction finished" in capture_post.out)
-        self.assertTrue("] Signal separation finished" in capture_post.out)
-        self.assertFalse("Loading image" in capture_post.out)
-        self.assertFalse("NMF converged after" in capture_post.out)
-        self.compare_output(exp)
-
-    def test_verbosity_5(self):
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=1,
-            ncores_separation=1,
-            verbosity=5,
-        )
-        exp.separate()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-outputs
-        self.assertTrue("Loading image" in capture_post.out)
-        self.assertTrue("NMF converged after" in capture_post.out)
-        self.compare_output(exp)
+    def test_verbosity(self):
+        n_images = len(self.image_names)
+        n_rois = len(self.roi_paths)
+        single_core = {"ncores_preparation": 1, "ncores_separation": 1}
+        progress_bars = [
+            "Extracting traces: 100%",
+            "Separating data: 100%",
+            "{0}/{0}".format(n_images),
+            "{0}/{0}".format(n_rois),
+        ]
+        # For each verbosity level: the extra Experiment arguments to use,
+        # the strings which must appear in stdout, the strings which must not
+        # appear in stdout, and the strings which must appear in stderr.
+        cases = {
+            1: (
+                {},
+                ["Finished separating"],
+                ["Doing region growing and data extraction", "nRegions: ", "method: "],
+                progress_bars,
+            ),
+            2: (
+                {},
+                [
+                    "Finished separating",
+                    "Doing region growing and data extraction",
+                    "nRegions: ",
+                    "method: ",
+                ],
+                [
+                    "[Extraction 1/{}]".format(n_images),
+                    "[Separation 1/{}]".format(n_rois),
+                ],
+                progress_bars,
+            ),
+            3: (
+                single_core,
+                [
+                    "Doing region growing and data extraction",
+                    "[Extraction 1/{}]".format(n_images),
+                    "[Separation 1/{}]".format(n_rois),
+                ],
+                ["] Extraction finished", "] Signal separation finished"],
+                [],
+            ),
+            4: (
+                single_core,
+                ["] Extraction finished", "] Signal separation finished"],
+                ["Loading image", "NMF converged after"],
+                [],
+            ),
+            5: (
+                single_core,
+                ["Loading image", "NMF converged after"],
+                [],
+                [],
+            ),
+        }
+        for verbosity in sorted(cases):
+            kwargs, out_present, out_absent, err_present = cases[verbosity]
+            with self.subTest(verbosity=verbosity):
+                capture_pre = self.capsys.readouterr()  # Clear stdout
+                exp = core.Experiment(
+                    self.images_dir, self.roi_zip_path, verbosity=verbosity, **kwargs
+                )
+                exp.separate()
+                # Capture and then re-output
+                capture_post = self.recapsys(capture_pre)
+                # Check all the fragments at once, so a failure lists every
+                # fragment which was missing or unexpectedly present
+                self.assertEqual(
+                    [x for x in out_present if x not in capture_post.out], []
+                )
+                self.assertEqual([x for x in out_absent if x in capture_post.out], [])
+                self.assertEqual(
+                    [x for x in err_present if x not in capture_post.err], []
+                )
+                self.compare_output(exp)
 
     def test_verbosity_3_imagesloaded(self):
-        # Load images as np.ndarrays
-        image_paths = [os.path.join(self.images_dir, img) for img in self.image_names]
-        datahandler = extraction.DataHandlerTifffile()
-        images = [datahandler.image2array(pth) for pth in image_paths]
+        # Get images as np.ndarrays
+        images = self.get_preloaded_images()
         # Run FISSA on pre-loaded images
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(
@@ -598,10 +839,8 @@ class ExperimentTestMixin:
         self.compare_output(exp, separated=False)
 
     def test_verbosity_4_imagesloaded(self):
-        # Load images as np.ndarrays
-        image_paths = [os.path.join(self.images_dir, img) for img in self.image_names]
-        datahandler = extraction.DataHandlerTifffile()
-        images = [datahandler.image2array(pth) for pth in image_paths]
+        # Get images as np.ndarrays
+        images = self.get_preloaded_images()
         # Run FISSA on pre-loaded images
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(
@@ -626,63 +865,31 @@ class ExperimentTestMixin:
             warnings.simplefilter("ignore")
             exp.separate()
         capture_post = self.recapsys(capture_pre)  # Capture and then re-outputs
-        any_non_converged = np.any([not info_i[0]["converged"] for info_i in exp.info])
+        any_non_converged = any(not info_i[0]["converged"] for info_i in exp.info)
         if any_non_converged:
             self.assertTrue("did not converge" in capture_post.out)
 
-    def test_ncores_preparation_None(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=None,
-        )
-        exp.separation_prep()
-        self.compare_output(exp, separated=False)
-
-    def test_ncores_preparation_1(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=1,
-        )
-        exp.separation_prep()
-        self.compare_output(exp, separated=False)
-
-    def test_ncores_preparation_2(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_preparation=2,
-        )
-        exp.separation_prep()
-        self.compare_output(exp, separated=False)
-
-    def test_ncores_separate_None(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_separation=None,
-        )
-        exp.separate()
-        self.compare_output(exp)
-
-    def test_ncores_separate_1(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_separation=1,
-        )
-        exp.separate()
-        self.compare_output(exp)
-
-    def test_ncores_separate_2(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            ncores_separation=2,
-        )
-        exp.separate()
-        self.compare_output(exp)
+    def test_ncores_preparation(self):
+        for ncores_preparation in [None, 1, 2]:
+            with self.subTest(ncores_preparation=ncores_preparation):
+                exp = core.Experiment(
+                    self.images_dir,
+                    self.roi_zip_path,
+                    ncores_preparation=ncores_preparation,
+                )
+                exp.separation_prep()
+                self.compare_output(exp, separated=False)
+
+    def test_ncores_separate(self):
+        for ncores_separation in [None, 1, 2]:
+            with self.subTest(ncores_separation=ncores_separation):
+                exp = core.Experiment(
+                    self.images_dir,
+                    self.roi_zip_path,
+                    ncores_separation=ncores_separation,
+                )
+                exp.separate()
+                self.compare_output(exp)
 
     def test_lowmemorymode(self):
         exp = core.Experiment(
@@ -702,32 +909,20 @@ class ExperimentTestMixin:
                 datahandler=extraction.DataHandlerTifffile(),
             )
 
-    def test_manualhandler_Tifffile(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            datahandler=extraction.DataHandlerTifffile(),
-        )
-        exp.separate()
-        self.compare_output(exp)
-
-    def test_manualhandler_TifffileLazy(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            datahandler=extraction.DataHandlerTifffileLazy(),
-        )
-        exp.separate()
-        self.compare_output(exp)
-
-    def test_manualhandler_Pillow(self):
-        exp = core.Experiment(
-            self.images_dir,
-            self.roi_zip_path,
-            datahandler=extraction.DataHandlerPillow(),
-        )
-        exp.separate()
-        self.compare_output(exp)
+    def test_manualhandler(self):
+        for datahandler_class in [
+            extraction.DataHandlerTifffile,
+            extraction.DataHandlerTifffileLazy,
+            extraction.DataHandlerPillow,
+        ]:
+            with self.subTest(datahandler=datahandler_class.__name__):
+                exp = core.Experiment(
+                    self.images_dir,
+                    self.roi_zip_path,
+                    datahandler=datahandler_class(),
+                )
+                exp.separate()
+                self.compare_output(exp)
 
     def test_caching(self):
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
@@ -735,56 +930,60 @@ class ExperimentTestMixin:
 
     def test_prefolder(self):
         os.makedirs(self.output_dir)
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
+        exp = core.Experiment(
+            self.get_preloaded_images(), self.roi_zip_path, self.output_dir
+        )
         exp.separate()
 
     def test_cache_pwd_explict(self):
         """Check we can use pwd as the cache folder."""
-        prevdir = os.getcwd()
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        try:
-            os.chdir(self.output_dir)
-            exp = core.Experiment(self.images_dir, self.roi_zip_path, ".")
-            exp.separate()
-        finally:
-            os.chdir(prevdir)
+        os.makedirs(self.output_dir)
+        # Change directory with monkeypatch, which restores the working
+        # directory after the test
+        self._request.getfixturevalue("monkeypatch").chdir(self.output_dir)
+        exp = core.Experiment(self.get_preloaded_images(), self.roi_zip_path, ".")
+        exp.separate()
 
     def test_cache_pwd_implicit(self):
         """Check we can use pwd as the cache folder."""
-        prevdir = os.getcwd()
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        try:
-            os.chdir(self.output_dir)
-            exp = core.Experiment(self.images_dir, self.roi_zip_path, "")
-            exp.separate()
-        finally:
-            os.chdir(prevdir)
+        os.makedirs(self.output_dir)
+        # Change directory with monkeypatch, which restores the working
+        # directory after the test
+        self._request.getfixturevalue("monkeypatch").chdir(self.output_dir)
+        exp = core.Experiment(self.get_preloaded_images(), self.roi_zip_path, "")
+        exp.separate()
 
     def test_subfolder(self):
         """Check we can write to a subfolder."""
         output_dir = os.path.join(self.output_dir, "a", "b", "c")
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, output_dir)
+        exp = core.Experiment(
+            self.get_preloaded_images(), self.roi_zip_path, output_dir
+        )
         exp.separate()
 
     def test_folder_deleted_before_call(self):
         """Check we can write to a folder that is deleted in the middle."""
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
+        exp = core.Experiment(
+            self.get_preloaded_images(), self.roi_zip_path, self.output_dir
+        )
         # Delete the folder between instantiating Experiment and separate()
-        self.tearDown()
+        shutil.rmtree(self.output_dir)
         exp.separate()
 
     def test_folder_deleted_between_prep_sep(self):
         """Check we can write to a folder that is deleted in the middle."""
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
+        exp = core.Experiment(
+            self.get_preloaded_images(), self.roi_zip_path, self.output_dir
+        )
         # Delete the folder between separation_prep() and separate()
         exp.separation_prep()
-        self.tearDown()
+        shutil.rmtree(self.output_dir)
         exp.separate()
 
     def test_prepfirst(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
+        exp = core.Experiment(
+            self.get_preloaded_images(), self.roi_zip_path, self.output_dir
+        )
         exp.separation_prep()
         exp.separate()
         self.compare_output(exp)
@@ -808,9 +1007,8 @@ class ExperimentTestMixin:
         """Test whether cached output is loaded during init."""
         image_path = self.images_dir
         roi_path = self.roi_zip_path
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, self.output_dir)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test
         exp = core.Experiment(image_path, roi_path, self.output_dir)
         # Cache should be loaded without calling separate
@@ -818,9 +1016,8 @@ class ExperimentTestMixin:
 
     def test_load_cache_redo_prep(self):
         """Test redoing preparation after loading from cache."""
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Redo separation_prep
@@ -829,9 +1026,8 @@ class ExperimentTestMixin:
 
     def test_load_cache_redo_sep(self):
         """Test redo separation after loading from cache."""
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Redo separation
@@ -844,9 +1040,8 @@ class ExperimentTestMixin:
         """
         image_path = self.images_dir
         roi_path = self.roi_zip_path
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, self.output_dir, verbosity=3)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test; this should load the cache
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(image_path, roi_path, self.output_dir)
@@ -871,9 +1066,8 @@ class ExperimentTestMixin:
         """
         image_path = self.images_dir
         roi_path = self.roi_zip_path
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, self.output_dir)
-        exp1.separation_prep()
+        # Populate the cache with only the preparation outputs
+        self.seed_cache(self.output_dir, separated=False)
         # Make a new experiment we will test; this should load the cache
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(image_path, roi_path, self.output_dir, verbosity=3)
@@ -897,24 +1091,24 @@ class ExperimentTestMixin:
         image_path = self.images_dir
         roi_path = self.roi_zip_path
         prev_folder = os.path.join(self.output_dir, "a")
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, prev_folder)
-        exp1.separation_prep()
+        # Populate the cache with only the preparation outputs
+        self.seed_cache(prev_folder, separated=False)
+        exp1 = self.get_separated_experiment()
         # Make a new experiment we will test
         new_folder = os.path.join(self.output_dir, "b")
         exp = core.Experiment(image_path, roi_path, new_folder)
         exp.load(os.path.join(prev_folder, "prepared.npz"))
         # Cached prep should now be loaded correctly
-        self.compare_experiments(exp, exp1, folder=False)
+        self.compare_experiments(exp, exp1, folder=False, separated=False)
 
     def test_load_manual_sep(self):
         """Loading prep results from a different folder."""
         image_path = self.images_dir
         roi_path = self.roi_zip_path
         prev_folder = os.path.join(self.output_dir, "a")
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, prev_folder)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(prev_folder)
+        exp1 = self.get_separated_experiment()
         # Make a new experiment we will test
         new_folder = os.path.join(self.output_dir, "b")
         exp = core.Experiment(image_path, roi_path, new_folder)
@@ -927,9 +1121,9 @@ class ExperimentTestMixin:
         image_path = self.images_dir
         roi_path = self.roi_zip_path
         prev_folder = os.path.join(self.output_dir, "a")
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, prev_folder)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(prev_folder)
+        exp1 = self.get_separated_experiment()
         # Make a new experiment we will test
         new_folder = os.path.join(self.output_dir, "b")
         exp = core.Experiment(image_path, roi_path, new_folder)
@@ -942,9 +1136,9 @@ class ExperimentTestMixin:
         image_path = self.images_dir
         roi_path = self.roi_zip_path
         prev_folder = os.path.join(self.output_dir, "a")
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(image_path, roi_path, prev_folder)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(prev_folder)
+        exp1 = self.get_separated_experiment()
         # Make a new experiment we will test
         new_folder = os.path.join(self.output_dir, "b")
         exp = core.Experiment(image_path, roi_path, new_folder)
@@ -960,7 +1154,7 @@ class ExperimentTestMixin:
         """Behaviour when loading a prep cache that is empty."""
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Make an empty prep save file
-        np.savez_compressed(os.path.join(self.output_dir, "prepared.npz"))
+        self.write_empty_cache("prepared.npz")
         exp.separation_prep()
         self.compare_output(exp, separated=False)
 
@@ -968,7 +1162,7 @@ class ExperimentTestMixin:
         """Behaviour when loading a separated cache that is empty."""
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Make an empty separated save file
-        np.savez_compressed(os.path.join(self.output_dir, "separated.npz"))
+        self.write_empty_cache("separated.npz")
         exp.separate()
         self.compare_output(exp)
 
@@ -994,11 +1188,9 @@ class ExperimentTestMixin:
         """
         image_path = self.images_dir
         roi_path = self.roi_zip_path
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        os.makedirs(self.output_dir)
         # Make a bad cache
-        with open(os.path.join(self.output_dir, "prepared.npz"), "w") as f:
-            f.write("badfilecontents")
+        self.write_bad_cache("prepared.npz")
 
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(image_path, roi_path, self.output_dir)
@@ -1014,11 +1206,9 @@ class ExperimentTestMixin:
         """
         image_path = self.images_dir
         roi_path = self.roi_zip_path
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        os.makedirs(self.output_dir)
         # Make a bad cache
-        with open(os.path.join(self.output_dir, "prepared.npz"), "w") as f:
-            f.write("badfilecontents")
+        self.write_bad_cache("prepared.npz")
 
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp = core.Experiment(image_path, roi_path, self.output_dir)
@@ -1034,14 +1224,11 @@ class ExperimentTestMixin:
         """
         With a faulty prep cache, test prep catches error and runs when called.
         """
-        image_path = self.images_dir
+        images = self.get_preloaded_images()
         roi_path = self.roi_zip_path
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        exp = core.Experiment(image_path, roi_path, self.output_dir, verbosity=3)
+        exp = core.Experiment(images, roi_path, self.output_dir, verbosity=3)
         # Make a bad cache
-        with open(os.path.join(self.output_dir, "prepared.npz"), "w") as f:
-            f.write("badfilecontents")
+        self.write_bad_cache("prepared.npz")
 
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp.separation_prep()
@@ -1059,15 +1246,12 @@ class ExperimentTestMixin:
         """
         With a faulty separated cache, test separate catches error and runs when called.
         """
-        image_path = self.images_dir
+        images = self.get_preloaded_images()
         roi_path = self.roi_zip_path
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        exp = core.Experiment(image_path, roi_path, self.output_dir)
+        exp = core.Experiment(images, roi_path, self.output_dir)
         exp.separation_prep()
         # Make a bad cache
-        with open(os.path.join(self.output_dir, "separated.npz"), "w") as f:
-            f.write("badfilecontents")
+        self.write_bad_cache("separated.npz")
 
         capture_pre = self.capsys.readouterr()  # Clear stdout
         exp.separate()
@@ -1080,8 +1264,7 @@ class ExperimentTestMixin:
         """Saving prep results with manually specified filename."""
         destination = os.path.join(self.output_dir, "m", ".test_output.npz")
         os.makedirs(os.path.dirname(destination))
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separation_prep()
+        exp = self.get_separated_experiment()
         exp.save_prep(destination=destination)
         self.assertTrue(os.path.isfile(destination))
 
@@ -1089,22 +1272,37 @@ class ExperimentTestMixin:
         """Saving sep results with manually specified filename."""
         destination = os.path.join(self.output_dir, "m", ".test_output.npz")
         os.makedirs(os.path.dirname(destination))
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separate()
+        exp = self.get_separated_experiment()
         exp.save_separated(destination=destination)
         self.assertTrue(os.path.isfile(destination))
 
+    def test_manual_save_compressed(self):
+        """Saving results to compressed and uncompressed npz files."""
+        exp = self.get_separated_experiment()
+        for compress in [False, True]:
+            with self.subTest(compress=compress):
+                destination = os.path.join(
+                    self.output_dir, "compress-{}.npz".format(compress)
+                )
+                exp.save_separated(destination=destination, compress=compress)
+                with zipfile.ZipFile(destination) as zf:
+                    compress_types = {info.compress_type for info in zf.infolist()}
+                expected_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+                self.assert_equal(compress_types, {expected_type})
+                # Check the file can be loaded back in again
+                exp2 = core.Experiment(self.images_dir, self.roi_zip_path)
+                exp2.load(destination)
+                self.compare_experiments(exp2, exp, folder=False, prepared=False)
+
     def test_manual_save_sep_undefined(self):
         """Saving prep results without specifying a filename."""
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separation_prep()
+        exp = self.get_separated_experiment()
         with self.assertRaises(ValueError):
             exp.save_prep()
 
     def test_manual_save_prep_undefined(self):
         """Saving sep results without specifying a filename."""
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separate()
+        exp = self.get_separated_experiment()
         with self.assertRaises(ValueError):
             exp.save_separated()
 
@@ -1115,25 +1313,20 @@ class ExperimentTestMixin:
             exp.load()
 
     def test_calcdeltaf(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separate()
+        exp = self.get_separated_experiment()
         exp.calc_deltaf(self.fs)
         self.compare_output(exp, compare_deltaf=True)
 
     def test_calcdeltaf_quiet(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=0)
-        exp.separate()
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        with warnings.catch_warnings():
+        exp = self.get_separated_experiment(verbosity=0)
+        with warnings.catch_warnings(), self.capture_stdout() as stdout:
             warnings.simplefilter("ignore")
             exp.calc_deltaf(self.fs)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assert_equal(capture_post.out, "")
+        self.assert_equal(stdout.getvalue(), "")
         self.compare_output(exp, compare_deltaf=True)
 
     def test_calcdeltaf_verbosity2(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=2)
-        exp.separate()
+        exp = self.get_separated_experiment(verbosity=2)
         capture_pre = self.capsys.readouterr()  # Clear stdout
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
@@ -1143,8 +1336,7 @@ class ExperimentTestMixin:
         self.compare_output(exp, compare_deltaf=True)
 
     def test_calcdeltaf_verbosity4(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=4)
-        exp.separate()
+        exp = self.get_separated_experiment(verbosity=4)
         capture_pre = self.capsys.readouterr()  # Clear stdout
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
@@ -1161,15 +1353,10 @@ class ExperimentTestMixin:
         self.compare_output(exp, compare_deltaf=True)
 
     def test_calcdeltaf_notrawf0(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=4)
-        exp.separate()
+        exp = self.get_separated_experiment(verbosity=4)
         # Ignore division by zero, which is likely to occur now and something
         # we want to alert the user to.
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", message="divide by zero")
-            warnings.filterwarnings(
-                "ignore", message="invalid value encountered in true_divide"
-            )
+        with ignore_divzero():
             exp.calc_deltaf(self.fs, use_raw_f0=False)
         # We did not use this setting to generate the expected values, so can't
         # compare the output against the target.
@@ -1179,8 +1366,7 @@ class ExperimentTestMixin:
         self.assert_equal(np.shape(exp.deltaf_result), expected_shape)
 
     def test_calcdeltaf_notacrosstrials(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=4)
-        exp.separate()
+        exp = self.get_separated_experiment(verbosity=4)
         exp.calc_deltaf(self.fs, across_trials=False)
         # We did not use this setting to generate the expected values, so can't
         # compare the output against the target.
@@ -1190,15 +1376,10 @@ class ExperimentTestMixin:
         self.assert_equal(np.shape(exp.deltaf_result), expected_shape)
 
     def test_calcdeltaf_notrawf0_notacrosstrials(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path, verbosity=4)
-        exp.separate()
+        exp = self.get_separated_experiment(verbosity=4)
         # Ignore division by zero, which is likely to occur now and something
         # we want to alert the user to.
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", message="divide by zero")
-            warnings.filterwarnings(
-                "ignore", message="invalid value encountered in true_divide"
-            )
+        with ignore_divzero():
             exp.calc_deltaf(self.fs, use_raw_f0=False, across_trials=False)
         # We did not use this setting to generate the expected values, so can't
         # compare the output against the target.
@@ -1220,10 +1401,9 @@ class ExperimentTestMixin:
             self.images_dir, self.roi_zip_path, self.output_dir, verbosity=0
         )
         exp.separate()
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp.to_matfile()
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assert_equal(capture_post.out, "")
+        with self.capture_stdout() as stdout:
+            exp.to_matfile()
+        self.assert_equal(stdout.getvalue(), "")
 
     def test_matlab_custom_fname(self):
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
@@ -1234,15 +1414,13 @@ class ExperimentTestMixin:
         self.compare_matlab(fname, exp)
 
     def test_matlab_no_cache_no_fname(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separate()
+        exp = self.get_separated_experiment()
         self.assertRaises(ValueError, exp.to_matfile)
 
     def test_matlab_from_cache(self):
         """Save to matfile after loading from cache."""
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Cache should be loaded without calling separate
@@ -1282,10 +1460,9 @@ class ExperimentTestMixin:
             self.images_dir, self.roi_zip_path, self.output_dir, verbosity=0
         )
         exp.separate()
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        exp.to_matfile(legacy=True)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assert_equal(capture_post.out, "")
+        with self.capture_stdout() as stdout:
+            exp.to_matfile(legacy=True)
+        self.assert_equal(stdout.getvalue(), "")
 
     def test_matlab_legacy_custom_fname(self):
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
@@ -1296,17 +1473,15 @@ class ExperimentTestMixin:
         self.compare_matlab_legacy(fname, exp)
 
     def test_matlab_legacy_no_cache_no_fname(self):
-        exp = core.Experiment(self.images_dir, self.roi_zip_path)
-        exp.separate()
+        exp = self.get_separated_experiment()
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", DeprecationWarning)
             self.assertRaises(ValueError, exp.save_to_matlab)
 
     def test_matlab_legacy_from_cache(self):
         """Save to matfile after loading from cache."""
-        # Run an experiment to generate the cache
-        exp1 = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
-        exp1.separate()
+        # Populate the cache
+        self.seed_cache(self.output_dir)
         # Make a new experiment we will test
         exp = core.Experiment(self.images_dir, self.roi_zip_path, self.output_dir)
         # Cache should be loaded without calling separate
@@ -1388,53 +1563,38 @@ class ExperimentTestMixin:
 class TestExperimentB(BaseTestCase, ExperimentTestMixin):
     """Test core on Experiment B, which has 2 ROIs and 3 TIFFs."""
 
+    resources_dir = RESOURCES_DIR
+    images_dir = os.path.join(RESOURCES_DIR, "images")
+    image_names = ["AVG_A01.tif", "AVG_A02.tif", "AVG_A03.tif"]
+    image_shape = (29, 21)
+    fs = 1
+    roi_zip_path = os.path.join(RESOURCES_DIR, "rois.zip")
+    roi_paths = [os.path.join("rois", "{:02d}.roi") for r in range(3, 5)]
+
     def __init__(self, *args, **kwargs):
         super(TestExperimentB, self).__init__(*args, **kwargs)
-        ExperimentTestMixin.__init__(self)
-
-        self.resources_dir = os.path.join(self.test_directory, "resources", "b")
-        self.images_dir = os.path.join(self.resources_dir, "images")
-        self.image_names = ["AVG_A01.tif", "AVG_A02.tif", "AVG_A03.tif"]
-        self.image_shape = (29, 21)
-        self.fs = 1
-        self.roi_zip_path = os.path.join(self.resources_dir, "rois.zip")
-        self.roi_paths = [os.path.join("rois", "{:02d}.roi") for r in range(3, 5)]
-
-        self.expected = np.load(
-            os.path.join(
-                self.resources_dir,
-                "expected_py{}.npz".format(sys.version_info.major),
-            ),
-            allow_pickle=True,
-        )
+        self.expected = load_expected(self.resources_dir)
 
 
 class TestExtract(BaseTestCase):
     """Tests for the extract helper function."""
 
-    def __init__(self, *args, **kwargs):
-        super(TestExtract, self).__init__(*args, **kwargs)
+    resources_dir = RESOURCES_DIR
+    images_dir = os.path.join(RESOURCES_DIR, "images")
+    image_name = "AVG_A01.tif"
+    image_path = os.path.join(images_dir, image_name)
+    image_shape = (29, 21)
+    roi_zip_path = os.path.join(RESOURCES_DIR, "rois.zip")
+    roi_paths = [os.path.join("rois", "{:02d}.roi") for r in range(3, 5)]
 
+    @classmethod
+    def setUpClass(cls):
         # Load cached data
-        self.resources_dir = os.path.join(self.test_directory, "resources", "b")
-        self.images_dir = os.path.join(self.resources_dir, "images")
-        self.image_name = "AVG_A01.tif"
-        self.image_path = os.path.join(self.images_dir, self.image_name)
-        self.image_shape = (29, 21)
-        self.roi_zip_path = os.path.join(self.resources_dir, "rois.zip")
-        self.roi_paths = [os.path.join("rois", "{:02d}.roi") for r in range(3, 5)]
-
-        cache = np.load(
-            os.path.join(
-                self.resources_dir,
-                "expected_py{}.npz".format(sys.version_info.major),
-            ),
-            allow_pickle=True,
-        )
+        cache = load_expected(cls.resources_dir)
         # Test against saved data for the first image only
-        self.expected_raw = np.stack(cache["raw"][:, 0], axis=0)
-        self.expected_roi_polys = list(cache["roi_polys"][:, 0])
-        self.expected_mean = cache["means"][0]
+        cls.expected_raw = np.stack(cache["raw"][:, 0], axis=0)
+        cls.expected_roi_polys = cache["roi_polys"][:, 0]
+        cls.expected_mean = cache["means"][0]
 
     def compare_outputs(self, outputs):
         data, roi_polys, mean = outputs
@@ -1449,45 +1609,40 @@ class TestExtract(BaseTestCase):
 
     def test_separate_trials_label_int(self):
         label = 239457
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        outputs = core.extract(self.image_path, self.roi_zip_path, label=label)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue(str(label) in capture_post.out)
+        with self.capture_stdout() as stdout:
+            outputs = core.extract(self.image_path, self.roi_zip_path, label=label)
+        self.assertIn(str(label), stdout.getvalue())
         self.compare_outputs(outputs)
 
     def test_separate_trials_label_str(self):
         label = "awesome_roi"
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        outputs = core.extract(self.image_path, self.roi_zip_path, label=label)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue(label in capture_post.out)
+        with self.capture_stdout() as stdout:
+            outputs = core.extract(self.image_path, self.roi_zip_path, label=label)
+        self.assertIn(label, stdout.getvalue())
         self.compare_outputs(outputs)
 
 
 class TestSeparateTrials(BaseTestCase):
     """Tests for the separate_trials helper function."""
 
-    def __init__(self, *args, **kwargs):
-        super(TestSeparateTrials, self).__init__(*args, **kwargs)
+    resources_dir = RESOURCES_DIR
 
+    @classmethod
+    def setUpClass(cls):
         # Load cached data
-        self.resources_dir = os.path.join(self.test_directory, "resources", "b")
-        cache = np.load(
-            os.path.join(
-                self.resources_dir,
-                "expected_py{}.npz".format(sys.version_info.major),
-            ),
-            allow_pickle=True,
-        )
-        # Test against saved data for the first ROI
-        self.raw = cache["raw"][0]
-        self.expected_sep = list(cache["sep"][0])
-        self.expected_match = list(cache["result"][0])
-        self.expected_mixmat = cache["mixmat"][0][0]
-        self.expected_convergence = cache["info"][0][0]
+        cache = load_expected(cls.resources_dir)
+        # Test against saved data for the first ROI.
+        # This is a row of an object array, as passed by Experiment.separate.
+        # Copy it, since the expected outputs are shared with other tests.
+        cls.raw = cache["raw"][0].copy()
+        cls.expected_sep = cache["sep"][0]
+        cls.expected_match = cache["result"][0]
+        cls.expected_mixmat = cache["mixmat"][0][0]
+        # Copy, since the expected outputs are shared with other tests
+        cls.expected_convergence = dict(cache["info"][0][0])
         # We can't require the number of iterations to be the same across
         # all versions of sklearn.
-        self.expected_convergence.pop("iterations")
+        cls.expected_convergence.pop("iterations")
 
     def compare_outputs(self, outputs):
         Xsep, Xmatch, Xmixmat, convergence = outputs
@@ -1503,18 +1658,16 @@ class TestSeparateTrials(BaseTestCase):
 
     def test_separate_trials_label_int(self):
         label = 239457
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        outputs = core.separate_trials(self.raw, label=label, verbosity=1)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue(str(label) in capture_post.out)
+        with self.capture_stdout() as stdout:
+            outputs = core.separate_trials(self.raw, label=label, verbosity=1)
+        self.assertIn(str(label), stdout.getvalue())
         self.compare_outputs(outputs)
 
     def test_separate_trials_label_str(self):
         label = "awesome_roi"
-        capture_pre = self.capsys.readouterr()  # Clear stdout
-        outputs = core.separate_trials(self.raw, label=label, verbosity=1)
-        capture_post = self.recapsys(capture_pre)  # Capture and then re-output
-        self.assertTrue(label in capture_post.out)
+        with self.capture_stdout() as stdout:
+            outputs = core.separate_trials(self.raw, label=label, verbosity=1)
+        self.assertIn(label, stdout.getvalue())
         self.compare_outputs(outputs)
 
     @unittest.skipIf(sys.version_info < (3, 2), "assertWarnsRegex only on Python>=3.3")
@@ -1529,89 +1682,66 @@ class TestSeparateTrials(BaseTestCase):
             core.separate_trials(self.raw - 1e6, label=label)
 
 
-class TestPrettyTimedelta(BaseTestCase):
-    """Tests for the _pretty_timedelta helper function."""
-
-    def test_less_than_1s(self):
-        actual = core._pretty_timedelta(seconds=0.12)
-        self.assert_equal(actual, "0.120 seconds")
-        actual = core._pretty_timedelta(seconds=0.1234)
-        self.assert_equal(actual, "0.123 seconds")
-
-    def test_less_than_1s_td(self):
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=0.12))
-        self.assert_equal(actual, "0.120 seconds")
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=0.1234))
-        self.assert_equal(actual, "0.123 seconds")
-
-    def test_less_than_10s(self):
-        actual = core._pretty_timedelta(seconds=7.3)
-        self.assert_equal(actual, "7.30 seconds")
-        actual = core._pretty_timedelta(seconds=7.123)
-        self.assert_equal(actual, "7.12 seconds")
-
-    def test_less_than_10s_td(self):
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=7.3))
-        self.assert_equal(actual, "7.30 seconds")
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=7.123))
-        self.assert_equal(actual, "7.12 seconds")
-
-    def test_less_than_60s(self):
-        actual = core._pretty_timedelta(seconds=30)
-        self.assert_equal(actual, "30.0 seconds")
-        actual = core._pretty_timedelta(seconds=30.123)
-        self.assert_equal(actual, "30.1 seconds")
-
-    def test_less_than_60s_td(self):
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=30))
-        self.assert_equal(actual, "30.0 seconds")
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=30.123))
-        self.assert_equal(actual, "30.1 seconds")
-
-    def test_less_than_1h(self):
-        actual = core._pretty_timedelta(seconds=120)
-        self.assert_equal(actual, "2 min, 0 sec")
-        actual = core._pretty_timedelta(seconds=123.4)
-        self.assert_equal(actual, "2 min, 3 sec")
-
-    def test_less_than_1h_td(self):
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=120))
-        self.assert_equal(actual, "2 min, 0 sec")
-        actual = core._pretty_timedelta(datetime.timedelta(seconds=123.4))
-        self.assert_equal(actual, "2 min, 3 sec")
-
-    def test_arbitrary_td(self):
-        kwargs = {
-            "days": 1,
-            "seconds": 2,
-            "microseconds": 3,
-            "milliseconds": 4,
-            "minutes": 5,
-            "hours": 6,
-            "weeks": 7,
-        }
-        td = datetime.timedelta(**kwargs)
-        actual = core._pretty_timedelta(td)
-        self.assert_equal(actual, str(td))
-
-    def test_arbitrary_args(self):
-        kwargs = {
-            "days": 7,
-            "seconds": 6,
-            "microseconds": 5,
-            "milliseconds": 4,
-            "minutes": 3,
-            "hours": 2,
-            "weeks": 1,
-        }
-        td = datetime.timedelta(**kwargs)
-        actual = core._pretty_timedelta(**kwargs)
-        self.assert_equal(actual, str(td))
-
-    def test_double_arg_spec(self):
-        with self.assertRaises(ValueError):
-            core._pretty_timedelta(datetime.timedelta(minutes=1), seconds=5)
-
-    def test_first_arg_not_timedelta(self):
-        with self.assertRaises(ValueError):
-            core._pretty_timedelta(5)
+# Durations in seconds and their expected representation by _pretty_timedelta
+PRETTY_TIMEDELTA_CASES = [
+    (0.12, "0.120 seconds"),
+    (0.1234, "0.123 seconds"),
+    (7.3, "7.30 seconds"),
+    (7.123, "7.12 seconds"),
+    (30, "30.0 seconds"),
+    (30.123, "30.1 seconds"),
+    (120, "2 min, 0 sec"),
+    (123.4, "2 min, 3 sec"),
+]
+
+
+@pytest.mark.parametrize("seconds, expected", PRETTY_TIMEDELTA_CASES)
+def test_pretty_timedelta(seconds, expected):
+    actual = core._pretty_timedelta(seconds=seconds)
+    base_test.assert_equal(actual, expected)
+
+
+@pytest.mark.parametrize("seconds, expected", PRETTY_TIMEDELTA_CASES)
+def test_pretty_timedelta_td(seconds, expected):
+    actual = core._pretty_timedelta(datetime.timedelta(seconds=seconds))
+    base_test.assert_equal(actual, expected)
+
+
+def test_pretty_timedelta_arbitrary_td():
+    kwargs = {
+        "days": 1,
+        "seconds": 2,
+        "microseconds": 3,
+        "milliseconds": 4,
+        "minutes": 5,
+        "hours": 6,
+        "weeks": 7,
+    }
+    td = datetime.timedelta(**kwargs)
+    actual = core._pretty_timedelta(td)
+    base_test.assert_equal(actual, str(td))
+
+
+def test_pretty_timedelta_arbitrary_args():
+    kwargs = {
+        "days": 7,
+        "seconds": 6,
+        "microseconds": 5,
+        "milliseconds": 4,
+        "minutes": 3,
+        "hours": 2,
+        "weeks": 1,
+    }
+    td = datetime.timedelta(**kwargs)
+    actual = core._pretty_timedelta(**kwargs)
+    base_test.assert_equal(actual, str(td))
+
+
+def test_pretty_timedelta_double_arg_spec():
+    with pytest.raises(ValueError):
+        core._pretty_timedelta(datetime.timedelta(minutes=1), seconds=5)
+
+
+def test_pretty_timedelta_first_arg_not_timedelta():
+    with pytest.raises(ValueError):
+        core._pretty_timedelta(5)
@@ -9,6 +9,7 @@ import os
 import shutil
 import sys
 import tempfile
+import warnings
 
 import numpy as np
 import pytest
@@ -21,6 +22,60 @@ from .base_test import BaseTestCase
 
 RESOURCES_DIR = os.path.join(base_test.TEST_DIRECTORY, "resources", "tiffs")
 
+# Data types of the generated TIFF files
+TIFF_DTYPES = [
+    "uint8",
+    "uint16",
+    "uint64",
+    "int16",
+    "int64",
+    "float16",
+    "float32",
+    "float64",
+]
+
+# Base names of the generated multiframe TIFF files, one for each way of
+# writing them
+MULTIFRAME_BASE_FNAMES = [
+    "tifffile.imsave",
+    "tifffile.imsave.bigtiff",
+    "TiffWriter.mixedA",
+    "TiffWriter.mixedB",
+    "TiffWriter.mixedC",
+    "TiffWriter.save",
+    "TiffWriter.write.contiguous",
+    "TiffWriter.write.discontiguous",
+]
+
+# Base names and shapes of the generated 4d and 5d TIFF files
+HIGHERDIM_BASE_FNAMES = [
+    "tifffile.imsave",
+    "tifffile.imsave.bigtiff",
+    "TiffWriter.save",
+    "TiffWriter.write.contiguous",
+    "TiffWriter.write.discontiguous",
+]
+HIGHERDIM_SHAPES = ["3,2,3,2", "2,1,3,3,2", "2,3,1,1,3,2"]
+
+# Contents of the multiframe TIFF files, before conversion to their dtype
+MULTIFRAME_BASE = np.array(
+    [
+        [[-11, 12], [14, 15], [17, 18]],
+        [[21, 22], [24, 25], [27, 28]],
+        [[31, 32], [34, 35], [37, 38]],
+        [[41, 42], [44, 45], [47, 48]],
+        [[51, 52], [54, 55], [57, 58]],
+        [[61, 62], [64, 55], [67, 68]],
+    ]
+)
+
+# Expected contents of the multiframe TIFF files, keyed by dtype
+_MULTIFRAME_EXPECTED = {}
+
+# Mean over frames of the expected contents of the multiframe TIFF files,
+# keyed by dtype
+_MULTIFRAME_EXPECTED_MEAN = {}
+
 
 def get_dtyped_expected(expected, dtype):
     """
@@ -46,10 +101,56 @@ def get_dtyped_expected(expected, dtype):
     return expected.astype(dtype)
 
 
-@pytest.mark.parametrize(
-    "dtype",
-    ["uint8", "uint16", "uint64", "int16", "int64", "float16", "float32", "float64"],
-)
+def get_multiframe_expected(dtype):
+    """
+    Get the expected contents of the multiframe TIFF files for a dtype.
+
+    The array is only generated the first time each dtype is requested. It is
+    shared between tests, so it is read-only.
+
+    Parameters
+    ----------
+    dtype : str
+        String specifying a dtype, e.g. ``"uint8"``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Expected contents, shaped ``(6, 3, 2)``.
+    """
+    if dtype not in _MULTIFRAME_EXPECTED:
+        expected = get_dtyped_expected(MULTIFRAME_BASE, dtype)
+        expected.flags.writeable = False
+        _MULTIFRAME_EXPECTED[dtype] = expected
+    return _MULTIFRAME_EXPECTED[dtype]
+
+
+def get_multiframe_expected_mean(dtype):
+    """
+    Get the expected mean over frames of the multiframe TIFF files for a dtype.
+
+    The mean is only computed the first time each dtype is requested. It is
+    shared between tests, so it is read-only.
+
+    Parameters
+    ----------
+    dtype : str
+        String specifying a dtype, e.g. ``"uint8"``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Expected mean, shaped ``(3, 2)``, with dtype float64.
+    """
+    if dtype not in _MULTIFRAME_EXPECTED_MEAN:
+        expected = get_multiframe_expected(dtype)
+        mean = np.mean(expected, dtype=np.float64, axis=0)
+        mean.flags.writeable = False
+        _MULTIFRAME_EXPECTED_MEAN[dtype] = mean
+    return _MULTIFRAME_EXPECTED_MEAN[dtype]
+
+
+@pytest.mark.parametrize("dtype", TIFF_DTYPES)
 @pytest.mark.parametrize("datahandler", [extraction.DataHandlerTifffile])
 def test_single_frame_3d(dtype, datahandler):
     """
@@ -112,39 +213,14 @@ def check_multiframe_image2array(base_fname, dtype, datahandler):
         value of ``np.asarray(datahandler.image2array)`` should be the entire
         contents of the TIFF file.
     """
-    expected = np.array(
-        [
-            [[-11, 12], [14, 15], [17, 18]],
-            [[21, 22], [24, 25], [27, 28]],
-            [[31, 32], [34, 35], [37, 38]],
-            [[41, 42], [44, 45], [47, 48]],
-            [[51, 52], [54, 55], [57, 58]],
-            [[61, 62], [64, 55], [67, 68]],
-        ]
-    )
-    expected = get_dtyped_expected(expected, dtype)
+    expected = get_multiframe_expected(dtype)
     fname = os.path.join(RESOURCES_DIR, base_fname + "_{}.tif".format(dtype))
     actual = datahandler.image2array(fname)
     base_test.assert_equal(actual, expected)
 
 
-@pytest.mark.parametrize(
-    "base_fname",
-    [
-        "tifffile.imsave",
-        "tifffile.imsave.bigtiff",
-        "TiffWriter.mixedA",
-        "TiffWriter.mixedB",
-        "TiffWriter.mixedC",
-        "TiffWriter.save",
-        "TiffWriter.write.contiguous",
-        "TiffWriter.write.discontiguous",
-    ],
-)
-@pytest.mark.parametrize(
-    "dtype",
-    ["uint8", "uint16", "uint64", "int16", "int64", "float16", "float32", "float64"],
-)
+@pytest.mark.parametrize("base_fname", MULTIFRAME_BASE_FNAMES)
+@pytest.mark.parametrize("dtype", TIFF_DTYPES)
 @pytest.mark.parametrize("datahandler", [extraction.DataHandlerTifffile])
 def test_multiframe_image2array(base_fname, dtype, datahandler):
     """
@@ -178,18 +254,9 @@ def test_multiframe_image2array_imagejformat(dtype, datahandler):
     )
 
 
-@pytest.mark.parametrize(
-    "base_fname",
-    [
-        "tifffile.imsave",
-        "tifffile.imsave.bigtiff",
-        "TiffWriter.save",
-        "TiffWriter.write.contiguous",
-        "TiffWriter.write.discontiguous",
-    ],
-)
+@pytest.mark.parametrize("base_fname", HIGHERDIM_BASE_FNAMES)
 @pytest.mark.parametrize("dtype", ["uint8"])
-@pytest.mark.parametrize("shp", ["3,2,3,2", "2,1,3,3,2", "2,3,1,1,3,2"])
+@pytest.mark.parametrize("shp", HIGHERDIM_SHAPES)
 @pytest.mark.parametrize("datahandler", [extraction.DataHandlerTifffile])
 def test_multiframe_image2array_higherdim(base_fname, shp, dtype, datahandler):
     """
@@ -228,50 +295,20 @@ def check_multiframe_mean(base_fname, dtype, datahandler):
         ``np.asarray(datahandler.getmean(datahandler.image2array(fname)))``
         must match the average over the contents of the TIFF file.
     """
-    expected = np.array(
-        [
-            [[-11, 12], [14, 15], [17, 18]],
-            [[21, 22], [24, 25], [27, 28]],
-            [[31, 32], [34, 35], [37, 38]],
-            [[41, 42], [44, 45], [47, 48]],
-            [[51, 52], [54, 55], [57, 58]],
-            [[61, 62], [64, 55], [67, 68]],
-        ]
-    )
-    expected = get_dtyped_expected(expected, dtype)
-    expected = np.mean(expected, dtype=np.float64, axis=0)
+    expected = get_multiframe_expected_mean(dtype)
     fname = os.path.join(RESOURCES_DIR, base_fname + "_{}.tif".format(dtype))
     data = datahandler.image2array(fname)
-    actual = datahandler.getmean(data)
+    try:
+        actual = datahandler.getmean(data)
+    finally:
+        # Release the file held open by lazy-loading data handlers
+        if not isinstance(data, np.ndarray):
+            data.close()
     base_test.assert_allclose(actual, expected)
 
 
-@pytest.mark.parametrize(
-    "base_fname",
-    [
-        "tifffile.imsave",
-        "tifffile.imsave.bigtiff",
-        "TiffWriter.mixedA",
-        "TiffWriter.mixedB",
-        "TiffWriter.mixedC",
-        "TiffWriter.save",
-        "TiffWriter.write.contiguous",
-        "TiffWriter.write.discontiguous",
-    ],
-)
-@pytest.mark.parametrize(
-    "dtype",
-    [
-        "uint8",
-        "uint16",
-        "uint64",
-        "int16",
-        "int64",
-        "float16",
-        "float32",
-        "float64",
-    ],
-)
+@pytest.mark.parametrize("base_fname", MULTIFRAME_BASE_FNAMES)
+@pytest.mark.parametrize("dtype", TIFF_DTYPES)
 @pytest.mark.parametrize(
     "datahandler", [extraction.DataHandlerTifffile, extraction.DataHandlerTifffileLazy]
 )
@@ -355,18 +392,9 @@ def test_multiframe_mean_imagejformat(dtype, datahandler):
     )
 
 
-@pytest.mark.parametrize(
-    "base_fname",
-    [
-        "tifffile.imsave",
-        "tifffile.imsave.bigtiff",
-        "TiffWriter.save",
-        "TiffWriter.write.contiguous",
-        "TiffWriter.write.discontiguous",
-    ],
-)
+@pytest.mark.parametrize("base_fname", HIGHERDIM_BASE_FNAMES)
 @pytest.mark.parametrize("dtype", ["uint8"])
-@pytest.mark.parametrize("shp", ["3,2,3,2", "2,1,3,3,2", "2,3,1,1,3,2"])
+@pytest.mark.parametrize("shp", HIGHERDIM_SHAPES)
 @pytest.mark.parametrize(
     "datahandler", [extraction.DataHandlerTifffile, extraction.DataHandlerTifffileLazy]
 )
@@ -446,10 +474,21 @@ class Rois2MasksTestMixin:
         np.array([[72.0, 107.0], [78.0, 130.0], [100.0, 110.0]]),
     ]
 
+    # Masks of polys and blank image data, which are the same for every test.
+    # The masks are only rasterised once, when the first test is set up.
+    _expected = None
+    _zeros = np.zeros((1, 176, 156))
+    _zeros.flags.writeable = False
+
     def setUp(self):
-        self.expected = roitools.getmasks(self.polys, (176, 156))
-        self.data = np.zeros((1, 176, 156))
-        # Child class must declare self.datahandler
+        if Rois2MasksTestMixin._expected is None:
+            expected = roitools.getmasks(self.polys, (176, 156))
+            for mask in expected:
+                mask.flags.writeable = False
+            Rois2MasksTestMixin._expected = expected
+        self.expected = Rois2MasksTestMixin._expected
+        self.data = self._zeros
+        # Child class must declare a datahandler attribute
 
     def test_imagej_zip(self):
         # load zip of rois
@@ -507,43 +546,57 @@ class Rois2MasksTestMixin:
 class TestRois2MasksRoitools(BaseTestCase, Rois2MasksTestMixin):
     """Test roitools.rois2masks."""
 
+    datahandler = roitools
+
     def setUp(self):
         Rois2MasksTestMixin.setUp(self)
         self.data = (176, 156)
-        self.datahandler = roitools
 
 
 class TestRois2MasksTifffile(BaseTestCase, Rois2MasksTestMixin):
     """Tests for rois2masks using `~extraction.DataHandlerTifffile`."""
 
+    # Data handlers are stateless, so one instance is shared by all the tests
+    datahandler = extraction.DataHandlerTifffile()
+
     def setUp(self):
         Rois2MasksTestMixin.setUp(self)
-        self.datahandler = extraction.DataHandlerTifffile()
 
 
 class TestRois2MasksTifffileLazy(BaseTestCase, Rois2MasksTestMixin):
     """Tests for rois2masks using `~extraction.DataHandlerTifffileLazy`."""
 
+    datahandler = extraction.DataHandlerTifffileLazy()
+
+    @classmethod
+    def setUpClass(cls):
+        # The TIFF contents are the same for every test, so only write it once
+        cls.class_tempdir = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.class_tempdir, "tmp.tif")
+        tifffile.imsave(cls.filename, Rois2MasksTestMixin._zeros)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.class_tempdir, ignore_errors=True)
+
     def setUp(self):
         Rois2MasksTestMixin.setUp(self)
-        os.makedirs(self.tempdir)
-        self.filename = os.path.join(self.tempdir, "tmp.tif")
-        tifffile.imsave(self.filename, self.data)
         self.data = tifffile.TiffFile(self.filename)
-        self.datahandler = extraction.DataHandlerTifffileLazy()
 
     def tearDown(self):
         self.data.close()
-        if os.path.isdir(self.tempdir):
-            shutil.rmtree(self.tempdir)
+        BaseTestCase.tearDown(self)
 
 
 class TestRois2MasksPillow(BaseTestCase, Rois2MasksTestMixin):
     """Tests for rois2masks using `~extraction.DataHandlerPillow`."""
 
+    datahandler = extraction.DataHandlerPillow()
+    # Blank image, which is only read by the tests so can be shared
+    _image = Image.fromarray(
+        Rois2MasksTestMixin._zeros.reshape((176, 156)).astype(np.uint8)
+    )
+
     def setUp(self):
         Rois2MasksTestMixin.setUp(self)
-        self.data = Image.fromarray(
-            self.data.reshape(self.data.shape[-2:]).astype(np.uint8)
-        )
-        self.datahandler = extraction.DataHandlerPillow()
+        self.data = self._image